@@ -6,7 +6,7 @@ import queue
 import threading
 
 from urllib.parse import urlparse, parse_qs
-from utils.template_utils import confirm_auth, set_access_token, get_template, delete_template, download_template, get_event_queue, zip_files, upload_template
+from utils.template_utils import confirm_auth, set_access_token, get_template, delete_template, download_template, get_event_queue, get_template_index, zip_files, upload_template
 
 template_manager = Blueprint('template_manager', __name__)
 
@@ -247,6 +247,78 @@ def upload_templates():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@template_manager.route("/index_templates", methods=["POST"])
+def index_templates():
+    """
+    Builds or refreshes the merge field index in the background.
+    Only templates whose updated_at has changed are downloaded and parsed again.
+    """
+
+    if not confirm_auth():
+        return jsonify({"error": "Access token not set"}), 400
+
+    data = request.get_json(silent=True) or {}
+    templates = data.get("files")  # Array of objects: {id, filename, updated_at}
+    prune = False
+
+    if not templates:
+        # Fall back to the list saved by /get_templates
+        try:
+            with open("static/templates.json") as f:
+                templates = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return jsonify({"error": "No templates to index. Fetch templates first."}), 400
+        # The saved list is the full template set, so templates missing from it were deleted
+        prune = True
+
+    def download_with_retry(file_id):
+        retry_count = 0
+        while True:
+            try:
+                return download_template(file_id)
+            except requests.exceptions.RequestException as e:
+                # Only rate limiting is worth retrying; other errors fail the template straight away
+                if e.response is None or e.response.status_code != 429:
+                    raise
+                retry_count += 1
+                if retry_count == 5:
+                    raise
+                retry_after = int(e.response.headers.get("Retry-After", 1))
+                print(f"Rate limited for ID {file_id}. Retrying after {retry_after} seconds.")
+                time.sleep(retry_after)
+
+    def build_index():
+        event_queue = get_event_queue()
+        result = get_template_index().update(
+            templates, download_with_retry, on_progress=event_queue.put, prune=prune
+        )
+        event_queue.put(
+            f"Indexing complete: {len(result['indexed'])} updated, "
+            f"{len(result['skipped'])} skipped, {len(result['failed'])} failed"
+        )
+
+    if get_template_index().update_lock.locked():
+        message = "Indexing already in progress. This refresh will run after it finishes."
+    else:
+        message = "Indexing initiated. Progress updates will follow."
+
+    threading.Thread(target=build_index).start()
+
+    return jsonify({"message": message})
+
+@template_manager.route("/search_templates", methods=["GET"])
+def search_templates():
+    """
+    Looks up templates by merge field and/or text using the template index.
+    """
+    field = request.args.get("field")
+    text = request.args.get("q")
+
+    if not field and not text:
+        return jsonify({"error": "Provide a 'field' or 'q' query parameter"}), 400
+
+    return jsonify(get_template_index().search(field=field, text=text))
+
 @template_manager.route("/stream-status")
 def stream_status():
     """
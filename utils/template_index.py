@@ -0,0 +1,347 @@
+import os
+import re
+import json
+import zipfile
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# Parts of a DOCX package that can contain merge fields or template text
+_PART_PATTERN = re.compile(r"^word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml$")
+
+# Clio merge fields are written inline as << Matter.Client.Name >>
+_TEXT_FIELD_PATTERN = re.compile(r"(?:<<|«)\s*([^<>«»]+?)\s*(?:>>|»)")
+_MERGEFIELD_PATTERN = re.compile(r"MERGEFIELD\s+\"?([^\s\"\\]+)", re.IGNORECASE)
+_TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9_.]*[a-z0-9]|[a-z0-9]")
+
+
+def extract_template_terms(content):
+    """
+    Stream the XML parts of a DOCX file and collect its merge fields and text tokens.
+
+    Args:
+        content (bytes): The DOCX file content.
+
+    Returns:
+        tuple: A sorted list of merge field names and a sorted list of lowercase text tokens.
+    """
+    fields = set()
+    tokens = set()
+
+    with zipfile.ZipFile(BytesIO(content)) as docx:
+        for part in docx.namelist():
+            if not _PART_PATTERN.match(part):
+                continue
+
+            with docx.open(part) as xml_file:
+                text_parts = []
+                # Open complex fields, innermost last. Each holds its instruction fragments
+                # and whether its instruction is still being read (before fldChar separate).
+                open_fields = []
+                # Every element is detached from its parent once read, so the tree never grows
+                # beyond the current branch no matter how large the document is
+                ancestors = []
+                for event, elem in ET.iterparse(xml_file, events=("start", "end")):
+                    if event == "start":
+                        ancestors.append(elem)
+                        continue
+
+                    ancestors.pop()
+                    if elem.tag == f"{WORD_NS}t" and elem.text:
+                        text_parts.append(elem.text)
+                    elif elem.tag == f"{WORD_NS}fldChar":
+                        field_type = elem.get(f"{WORD_NS}fldCharType")
+                        if field_type == "begin":
+                            open_fields.append({"instr": [], "reading": True})
+                        elif open_fields and field_type in ("separate", "end"):
+                            field = open_fields[-1]
+                            if field["reading"]:
+                                # Word splits instructions across runs mid-word, so join without spaces
+                                fields.update(_MERGEFIELD_PATTERN.findall("".join(field["instr"])))
+                                field["reading"] = False
+                            if field_type == "end":
+                                open_fields.pop()
+                    elif elem.tag == f"{WORD_NS}instrText" and elem.text:
+                        if open_fields and open_fields[-1]["reading"]:
+                            open_fields[-1]["instr"].append(elem.text)
+                    elif elem.tag == f"{WORD_NS}fldSimple":
+                        fields.update(_MERGEFIELD_PATTERN.findall(elem.get(f"{WORD_NS}instr", "")))
+                    elif elem.tag == f"{WORD_NS}p":
+                        text = "".join(text_parts)
+                        fields.update(_TEXT_FIELD_PATTERN.findall(text))
+                        tokens.update(_TOKEN_PATTERN.findall(text.lower()))
+                        text_parts = []
+
+                    elem.clear()
+                    if ancestors:
+                        ancestors[-1].remove(elem)
+
+    return sorted(fields), sorted(tokens)
+
+
+class TemplateIndex:
+    """
+    An inverted index from merge fields and text tokens to template IDs.
+    Template bytes are cached on disk and only re-downloaded and re-parsed
+    when a template's updated_at value changes.
+    """
+    def __init__(self, cache_dir="template_cache", max_workers=4):
+        """
+        Initialize the index and load any previously saved state.
+
+        Args:
+            cache_dir (str): Directory for cached template files and the saved index.
+            max_workers (int): Number of templates downloaded and parsed in parallel.
+        """
+        self.cache_dir = cache_dir
+        self.index_file = os.path.join(cache_dir, "index.json")
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.update_lock = threading.Lock()  # Held for a whole refresh so refreshes never overlap
+        self.templates = {}  # Template ID -> filename, updated_at, fields and tokens
+        self.fields = {}  # Lowercase merge field -> set of template IDs
+        self.tokens = {}  # Text token -> set of template IDs
+        self.load()
+
+    def load(self):
+        """
+        Load the saved index from disk, if one exists.
+        A missing or unreadable index starts empty and is rebuilt by the next refresh.
+        """
+        if not os.path.exists(self.index_file):
+            return
+
+        with self.lock:
+            self.templates = {}
+            self.fields = {}
+            self.tokens = {}
+            try:
+                with open(self.index_file) as f:
+                    templates = json.load(f)
+                for template_id, entry in templates.items():
+                    self._add_entry(template_id, entry)
+            except (OSError, json.JSONDecodeError, AttributeError, KeyError, TypeError) as e:
+                print(f"Could not load template index from {self.index_file}: {e}. Starting with an empty index.")
+                self.templates = {}
+                self.fields = {}
+                self.tokens = {}
+
+    def save(self):
+        """
+        Write the index to disk so it survives a restart.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self.lock:
+            data = json.dumps(self.templates, indent=4)
+        self._write_atomic(self.index_file, data.encode("utf-8"))
+
+    def _write_atomic(self, path, content):
+        """
+        Write to a temporary file and swap it into place, so readers never see a partial file.
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def _cache_path(self, template_id, updated_at):
+        version = re.sub(r"[^0-9A-Za-z]", "", str(updated_at))
+        return os.path.join(self.cache_dir, f"{template_id}_{version}.docx")
+
+    def _remove_cached(self, template_id, keep=None):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(f"{template_id}_") and name.endswith(".docx") and path != keep:
+                os.remove(path)
+
+    def _add_entry(self, template_id, entry):
+        self.templates[template_id] = entry
+        for field in entry["fields"]:
+            self.fields.setdefault(field.lower(), set()).add(template_id)
+        for token in entry["tokens"]:
+            self.tokens.setdefault(token, set()).add(template_id)
+
+    def _remove_entry(self, template_id):
+        entry = self.templates.pop(template_id, None)
+        if not entry:
+            return
+        for field in entry["fields"]:
+            ids = self.fields.get(field.lower())
+            if ids is not None:
+                ids.discard(template_id)
+                if not ids:
+                    del self.fields[field.lower()]
+        for token in entry["tokens"]:
+            ids = self.tokens.get(token)
+            if ids is not None:
+                ids.discard(template_id)
+                if not ids:
+                    del self.tokens[token]
+
+    def is_current(self, template_id, updated_at):
+        """
+        Check whether a template is already indexed at the given version.
+        """
+        with self.lock:
+            entry = self.templates.get(str(template_id))
+        return entry is not None and updated_at is not None and entry["updated_at"] == updated_at
+
+    def index_template(self, template, download):
+        """
+        Index a single template, downloading it only when the cached copy is stale.
+        Templates that are not DOCX files are recorded as skipped until their updated_at changes.
+
+        Args:
+            template (dict): Template metadata with id, filename and updated_at.
+            download (callable): Function taking a template ID and returning its bytes.
+
+        Returns:
+            str: None if the template was (re)indexed, otherwise the reason it was skipped.
+        """
+        template_id = str(template.get("id"))
+        updated_at = template.get("updated_at")
+
+        if self.is_current(template_id, updated_at):
+            with self.lock:
+                return self.templates[template_id].get("skipped_reason") or "Already up to date"
+
+        cache_path = self._cache_path(template_id, updated_at)
+        skipped_reason = None
+        fields, tokens = [], []
+
+        if updated_at is not None and os.path.exists(cache_path):
+            with open(cache_path, "rb") as f:
+                content = f.read()
+            fields, tokens = extract_template_terms(content)
+        else:
+            content = download(template_id)
+            if zipfile.is_zipfile(BytesIO(content)):
+                # Parse before caching so unreadable content never lands in the cache
+                fields, tokens = extract_template_terms(content)
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self._write_atomic(cache_path, content)
+                self._remove_cached(template_id, keep=cache_path)
+            else:
+                skipped_reason = "Not a DOCX file"
+                self._remove_cached(template_id)
+
+        entry = {
+            "filename": template.get("filename"),
+            "updated_at": updated_at,
+            "fields": fields,
+            "tokens": tokens,
+        }
+        if skipped_reason:
+            entry["skipped_reason"] = skipped_reason
+
+        with self.lock:
+            self._remove_entry(template_id)
+            self._add_entry(template_id, entry)
+        return skipped_reason
+
+    def update(self, templates, download, on_progress=None, prune=False):
+        """
+        Bring the index up to date with a list of templates, working in parallel.
+        Refreshes are serialized; a second call waits for the running one to finish.
+
+        Args:
+            templates (list): Template metadata dicts with id, filename and updated_at.
+            download (callable): Function taking a template ID and returning its bytes.
+            on_progress (callable): Optional callback receiving a status message.
+            prune (bool): Drop indexed templates missing from the list. Only use this
+                when the list is the full set of templates, not a selection.
+
+        Returns:
+            dict: IDs that were indexed, skipped (with a reason), failed or removed.
+        """
+        with self.update_lock:
+            return self._update(templates, download, on_progress, prune)
+
+    def _update(self, templates, download, on_progress, prune):
+        result = {"indexed": [], "skipped": [], "failed": [], "removed": []}
+
+        # Remove duplicate template IDs so no template is downloaded twice at once
+        unique_templates = []
+        seen_ids = set()
+        for template in templates:
+            template_id = str(template.get("id"))
+            if template_id not in seen_ids:
+                seen_ids.add(template_id)
+                unique_templates.append(template)
+        templates = unique_templates
+
+        if prune:
+            with self.lock:
+                for template_id in list(self.templates):
+                    if template_id not in seen_ids:
+                        self._remove_entry(template_id)
+                        result["removed"].append(template_id)
+            for template_id in result["removed"]:
+                self._remove_cached(template_id)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.index_template, template, download): str(template.get("id"))
+                for template in templates
+            }
+            for count, future in enumerate(as_completed(futures), start=1):
+                template_id = futures[future]
+                try:
+                    skipped_reason = future.result()
+                    if skipped_reason:
+                        result["skipped"].append({"id": template_id, "reason": skipped_reason})
+                    else:
+                        result["indexed"].append(template_id)
+                except Exception as e:
+                    result["failed"].append({"id": template_id, "error": str(e)})
+
+                if on_progress:
+                    on_progress(f"Indexed {count} of {len(futures)} templates")
+
+        self.save()
+        return result
+
+    def search(self, field=None, text=None):
+        """
+        Find templates that use a merge field and/or contain all words of a text query.
+
+        Args:
+            field (str): Merge field name, matched case-insensitively.
+            text (str): Words that must all appear in the template text.
+
+        Returns:
+            list: Matching templates with id, filename, updated_at and their merge fields.
+        """
+        with self.lock:
+            matches = None
+
+            if field:
+                matches = set(self.fields.get(field.strip().lower(), set()))
+
+            if text:
+                for token in _TOKEN_PATTERN.findall(text.lower()):
+                    ids = self.tokens.get(token, set())
+                    matches = set(ids) if matches is None else matches & ids
+
+            if matches is None:
+                return []
+
+            return [
+                {
+                    "id": template_id,
+                    "filename": self.templates[template_id]["filename"],
+                    "updated_at": self.templates[template_id]["updated_at"],
+                    "fields": self.templates[template_id]["fields"],
+                }
+                for template_id in sorted(matches)
+            ]
@@ -7,6 +7,7 @@ import base64
 from io import BytesIO
 
 from utils.rate_limiter import RateLimiter
+from utils.template_index import TemplateIndex
 
 #Default limit per Clio Documentation
 # https://docs.developers.clio.com/api-docs/rate-limits/
@@ -18,9 +19,15 @@ _access_token = None
 # Global event queue to store updates
 _event_queue = queue.Queue()
 
+# Merge field / text index over cached template contents
+_template_index = TemplateIndex()
+
 def get_event_queue():
     return _event_queue
 
+def get_template_index():
+    return _template_index
+
 def set_access_token(token):
     global _access_token
     _access_token = token
@@ -90,7 +97,7 @@ def get_template(page_token=None):
         "limit": 200,  # Maximum allowed by the API
         "order": "category.name(asc)",
         "parent_type": "matter",
-        "fields": "id,filename,document_category{id,name}"
+        "fields": "id,filename,updated_at,document_category{id,name}"
     }
     if page_token:
         params["page_token"] = page_token
@@ -158,11 +165,13 @@ def download_template(file_id):
     if response.status_code == 429:
         retry_after = int(response.headers.get("Retry-After", 1))
         raise requests.exceptions.RequestException(
-            f"Rate limited. Retry after {retry_after} seconds."
+            f"Rate limited. Retry after {retry_after} seconds.", response=response
         )
 
     if response.status_code != 200:
-        raise requests.exceptions.RequestException(f"HTTP {response.status_code}: {response.text}")
+        raise requests.exceptions.RequestException(
+            f"HTTP {response.status_code}: {response.text}", response=response
+        )
 
     return response.content
 